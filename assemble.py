@@ -5,11 +5,95 @@ Converts LC-3 assembly code to object files compatible with the LC-3 VM.
 """
 
 import sys
+import os
+import io
 import re
-import struct
-from typing import Dict, List, Tuple, Optional, Union
+import mmap
+import stat
+import locale
+import array
+import functools
+from typing import Callable, Dict, Iterable, Iterator, List, NoReturn, Tuple, Optional, Union
 from enum import Enum
 
+# Instruction opcodes
+_OPCODES = {
+    'BR': 0, 'BRN': 0, 'BRZ': 0, 'BRP': 0, 'BRNZ': 0, 'BRNP': 0, 'BRZP': 0, 'BRNZP': 0,
+    'ADD': 1,
+    'LD': 2,
+    'ST': 3,
+    'JSR': 4, 'JSRR': 4,
+    'AND': 5,
+    'LDR': 6,
+    'STR': 7,
+    'RTI': 8,
+    'NOT': 9,
+    'LDI': 10,
+    'STI': 11,
+    'JMP': 12, 'RET': 12,
+    'LEA': 14,
+    'TRAP': 15
+}
+
+# Trap vectors
+_TRAP_VECTORS = {
+    'GETC': 0x20,
+    'OUT': 0x21,
+    'PUTS': 0x22,
+    'IN': 0x23,
+    'PUTSP': 0x24,
+    'HALT': 0x25
+}
+
+# Registers
+_REGISTERS = {
+    'R0': 0, 'R1': 1, 'R2': 2, 'R3': 3,
+    'R4': 4, 'R5': 5, 'R6': 6, 'R7': 7
+}
+
+# Register operand as written (either case) -> canonical upper-case name
+_REGISTER_NAMES = {name: name for name in _REGISTERS}
+_REGISTER_NAMES.update({name.lower(): name for name in _REGISTERS})
+
+# Condition bits for each BR mnemonic; plain BR is unconditional
+_BR_NZP = {
+    'BR': 0b111, 'BRN': 0b100, 'BRZ': 0b010, 'BRP': 0b001,
+    'BRNZ': 0b110, 'BRNP': 0b101, 'BRZP': 0b011, 'BRNZP': 0b111
+}
+
+# (min, max, mask) of a signed field of each width, so range checks are two
+# compares and the two's-complement encoding is a single AND
+_SIGNED_FIELDS = {bits: (-(1 << (bits - 1)), (1 << (bits - 1)) - 1, (1 << bits) - 1)
+                  for bits in range(1, 17)}
+
+# Radix for each numeric prefix (x/X hex, b/B binary, # decimal)
+_NUMBER_PREFIXES = {'x': 16, 'X': 16, 'b': 2, 'B': 2, '#': 10}
+
+@functools.lru_cache(maxsize=4096)
+def _try_parse_number(token: str) -> Optional[int]:
+    """Parse a stripped numeric literal, or return None if it is not one.
+
+    Immediates repeat a lot, so results (including failures) are cached and
+    int()'s ValueError is raised at most once per distinct malformed token.
+    """
+    base = _NUMBER_PREFIXES.get(token[:1])
+    try:
+        if base is not None:
+            return int(token[1:], base)
+        # Plain decimal
+        return int(token)
+    except ValueError:
+        return None
+
+# .STRINGZ escape sequences; any other escaped character stands for itself
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\', '"': '"'}
+_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+
+def _decode_escape(match: re.Match) -> str:
+    """Replacement callback for _ESCAPE_RE"""
+    char = match.group(1)
+    return _ESCAPES.get(char, char)
+
 class TokenType(Enum):
     DIRECTIVE = "directive"
     INSTRUCTION = "instruction"
@@ -20,42 +104,24 @@ class TokenType(Enum):
     COMMENT = "comment"
     NEWLINE = "newline"
 
+# Peephole rewrites applied with -O: (mask, value, replacement). A rule fires
+# on an instruction word w when w & mask == value. Rewrites never add or remove
+# words, so every label keeps its address. (ADD Rx, Rx, #0 is not dropped: it
+# sets the condition codes and removing it would shift later addresses.)
+_PEEPHOLE_RULES = [
+    # BR of any condition to the next instruction falls through either way: NOP
+    (0xF1FF, 0x0000, 0x0000),
+]
+
+# One tokenized source line: (line_number, label, tokens, kind, data)
+_ParsedLine = Tuple[int, Optional[str], List[str], Optional[TokenType], object]
+
 class LC3Assembler:
     def __init__(self):
-        # Instruction opcodes
-        self.opcodes = {
-            'BR': 0, 'BRN': 0, 'BRZ': 0, 'BRP': 0, 'BRNZ': 0, 'BRNP': 0, 'BRZP': 0, 'BRNZP': 0,
-            'ADD': 1,
-            'LD': 2,
-            'ST': 3,
-            'JSR': 4, 'JSRR': 4,
-            'AND': 5,
-            'LDR': 6,
-            'STR': 7,
-            'RTI': 8,
-            'NOT': 9,
-            'LDI': 10,
-            'STI': 11,
-            'JMP': 12, 'RET': 12,
-            'LEA': 14,
-            'TRAP': 15
-        }
-        
-        # Trap vectors
-        self.trap_vectors = {
-            'GETC': 0x20,
-            'OUT': 0x21,
-            'PUTS': 0x22,
-            'IN': 0x23,
-            'PUTSP': 0x24,
-            'HALT': 0x25
-        }
-        
-        # Registers
-        self.registers = {
-            'R0': 0, 'R1': 1, 'R2': 2, 'R3': 3,
-            'R4': 4, 'R5': 5, 'R6': 6, 'R7': 7
-        }
+        # Static tables are shared module-level constants
+        self.opcodes = _OPCODES
+        self.trap_vectors = _TRAP_VECTORS
+        self.registers = _REGISTERS
         
         # Symbol table for labels
         self.symbol_table: Dict[str, int] = {}
@@ -66,37 +132,63 @@ class LC3Assembler:
         # Origin address
         self.origin = 0x3000
         
-        # Memory for assembled code
-        self.memory: List[int] = []
+        # Memory for assembled code: raw 16-bit words
+        self.memory = array.array('H')
+        
+        # Forward references patched after the pass:
+        # (word index, label, bits or None for absolute, pc at use, name, line number)
+        self._fixups: List[Tuple[int, str, Optional[int], int, str, int]] = []
         
         # Current line number for error reporting
         self.line_number = 0
         
-    def error(self, message: str) -> None:
-        """Print error message and exit"""
+        # Peephole optimization (-O): indices of instruction words in memory
+        self.optimize = False
+        self._code_indices = array.array('L')
+        
+        # Mnemonic -> encoder, built once so dispatch is a single lookup.
+        # Instructions sharing an operand format get a specialized closure per
+        # opcode (and per BR condition), with their constant bits baked in.
+        self._instr_dispatch = {
+            'NOT': self.assemble_not,
+            'JSR': self.assemble_jsr, 'JSRR': self.assemble_jsr,
+            'JMP': self.assemble_jmp,
+            'RET': lambda tokens: (_OPCODES['RET'] << 12) | (7 << 6),  # JMP R7
+            'TRAP': self.assemble_trap,
+            'RTI': self.assemble_rti
+        }
+        # Opcode numbers come from _OPCODES, grouped by operand format
+        for mnemonic in ('ADD', 'AND'):
+            self._instr_dispatch[mnemonic] = self._make_operate(_OPCODES[mnemonic], mnemonic)
+        for mnemonic in ('LD', 'ST', 'LDI', 'STI', 'LEA'):
+            self._instr_dispatch[mnemonic] = self._make_pc_rel9(_OPCODES[mnemonic], mnemonic)
+        for mnemonic in ('LDR', 'STR'):
+            self._instr_dispatch[mnemonic] = self._make_base_offset6(_OPCODES[mnemonic], mnemonic)
+        for mnemonic, nzp in _BR_NZP.items():
+            self._instr_dispatch[mnemonic] = self._make_br(nzp)
+        # Named traps like HALT, GETC, etc. always encode to the same word
+        for name, vector in _TRAP_VECTORS.items():
+            self._instr_dispatch[name] = lambda tokens, word=(15 << 12) | vector: word
+        
+    def error(self, message: str, *args) -> NoReturn:
+        """Print error message and exit (message is %-formatted with args only here)"""
+        if args:
+            message = message % args
         print(f"Error on line {self.line_number}: {message}", file=sys.stderr)
         sys.exit(1)
         
-    def warning(self, message: str) -> None:
-        """Print warning message"""
+    def warning(self, message: str, *args) -> None:
+        """Print warning message (message is %-formatted with args only here)"""
+        if args:
+            message = message % args
         print(f"Warning on line {self.line_number}: {message}", file=sys.stderr)
         
     def parse_number(self, token: str) -> int:
         """Parse a number in decimal, hex, or binary format"""
-        token = token.strip()
-        
-        if token.startswith('x') or token.startswith('X'):
-            # Hexadecimal
-            return int(token[1:], 16)
-        elif token.startswith('b') or token.startswith('B'):
-            # Binary
-            return int(token[1:], 2)
-        elif token.startswith('#'):
-            # Decimal with # prefix
-            return int(token[1:])
-        else:
-            # Plain decimal
-            return int(token)
+        value = _try_parse_number(token.strip())
+        if value is None:
+            raise ValueError(f"invalid number: {token!r}")
+        return value
             
     def sign_extend(self, value: int, bits: int) -> int:
         """Sign extend a value to 16 bits"""
@@ -118,17 +210,40 @@ class LC3Assembler:
         
     def tokenize_line(self, line: str) -> List[str]:
         """Tokenize a line of assembly code"""
-        # Remove comments
-        if ';' in line:
-            line = line[:line.index(';')]
-        
-        # Split by whitespace and commas
-        tokens = re.split(r'[\s,]+', line.strip())
-        return [token for token in tokens if token]
+        quote = line.find('"')
+        if quote < 0 or ';' in line[:quote]:
+            # No string literal outside the comment: split on whitespace/commas
+            return line.split(';', 1)[0].replace(',', ' ').split()
+        
+        tokens = line[:quote].replace(',', ' ').split()
+        
+        # Scan the string literal as a single token, skipping escaped characters
+        i = quote + 1
+        n = len(line)
+        while i < n and line[i] != '"':
+            i += 2 if line[i] == '\\' else 1
+        end = min(i + 1, n)
+        tokens.append(line[quote:end])
+        
+        # Whatever follows the closing quote (usually a comment)
+        tokens.extend(self.tokenize_line(line[end:]))
+        return tokens
+        
+    def canonicalize_tokens(self, tokens: List[str]) -> List[str]:
+        """Upper-case the mnemonic and register operands once (labels keep their case)"""
+        canonical = [tokens[0].upper()]
+        register_name = _REGISTER_NAMES.get
+        intern = sys.intern
+        for token in tokens[1:]:
+            # Other operands may be label references; interning them makes
+            # symbol_table lookups hit on identity
+            canonical.append(register_name(token) or intern(token))
+        return canonical
         
     def is_register(self, token: str) -> bool:
         """Check if token is a register"""
-        return token.upper() in self.registers
+        # Tokens from tokenize_all are already canonical; fold case for other callers
+        return token in _REGISTERS or token.upper() in _REGISTERS
         
     def is_label(self, token: str) -> bool:
         """Check if token is a label (ends with colon or is a valid identifier)"""
@@ -136,96 +251,152 @@ class LC3Assembler:
         
     def parse_register(self, token: str) -> int:
         """Parse register token"""
-        reg = token.upper()
-        if reg not in self.registers:
-            self.error(f"Invalid register: {token}")
-        return self.registers[reg]
+        reg = _REGISTERS.get(token)
+        if reg is None:
+            # Not canonicalized by tokenize_all (e.g. a direct caller passing 'r1')
+            reg = _REGISTERS.get(token.upper())
+            if reg is None:
+                self.error("Invalid register: %s", token)
+        return reg
         
     def parse_immediate(self, token: str) -> int:
         """Parse immediate value"""
-        try:
-            return self.parse_number(token)
-        except ValueError:
-            self.error(f"Invalid immediate value: {token}")
+        value = _try_parse_number(token)
+        if value is None:
+            self.error("Invalid immediate value: %s", token)
+        return value
+            
+    def _resolve_offset(self, token: str, bits: int, name: str) -> int:
+        """Resolve a label or immediate to a PC-relative offset masked to bits"""
+        address = self.symbol_table.get(token)
+        if address is not None:
+            offset = address - (self.pc + 1)
+        elif token.isidentifier():
+            # Possibly a label defined further down: leave the field zero and patch it later.
+            # The word being assembled is the next one appended to memory.
+            self._fixups.append((len(self.memory), token, bits, self.pc, name, self.line_number))
+            return 0
+        else:
+            offset = _try_parse_number(token)
+            if offset is None:
+                self.error("Undefined label or invalid offset: %s", token)
+                
+        return self._check_offset(offset, bits, name)
+        
+    def _check_offset(self, offset: int, bits: int, name: str) -> int:
+        """Range-check a signed offset and mask it to bits"""
+        low, high, mask = _SIGNED_FIELDS[bits]
+        if not low <= offset <= high:
+            self.error("%s offset out of range: %s", name, offset)
             
+        return offset & mask
+        
     def assemble_br(self, tokens: List[str]) -> int:
         """Assemble branch instruction"""
-        if len(tokens) != 2:
-            self.error("BR instruction requires exactly one operand")
+        mnemonic = tokens[0].upper()
+        if mnemonic not in _BR_NZP:
+            self.error("Invalid branch instruction: %s", tokens[0])
+        return self._instr_dispatch[mnemonic](tokens)
+        
+    def _make_br(self, nzp: int) -> Callable[[List[str]], int]:
+        """Build the encoder for one BR form with its condition bits baked in"""
+        base = (0 << 12) | (nzp << 9)
+        resolve_offset = self._resolve_offset
+        symbol_get = self.symbol_table.get
+        
+        def encode(tokens: List[str]) -> int:
+            if len(tokens) != 2:
+                self.error("BR instruction requires exactly one operand")
+                
+            # Fast path: a label already defined within reach
+            address = symbol_get(tokens[1])
+            if address is not None:
+                offset = address - (self.pc + 1)
+                if -256 <= offset <= 255:
+                    return base | (offset & 0x1FF)
+                    
+            return base | resolve_offset(tokens[1], 9, "Branch")
             
-        instr = tokens[0].upper()
-        
-        # Determine condition codes
-        n = z = p = 0
-        if 'N' in instr:
-            n = 1
-        if 'Z' in instr:
-            z = 1
-        if 'P' in instr:
-            p = 1
+        return encode
+        
+    def _make_operate(self, opcode: int, name: str) -> Callable[[List[str]], int]:
+        """Build the encoder for ADD/AND: DR, SR1, then SR2 or imm5"""
+        base = opcode << 12
+        parse_register = self.parse_register
+        register_get = _REGISTERS.get
+        
+        def encode(tokens: List[str]) -> int:
+            if len(tokens) != 4:
+                self.error("%s instruction requires exactly 3 operands", name)
+                
+            dr = parse_register(tokens[1])
+            sr1 = parse_register(tokens[2])
+            
+            # Check if third operand is register or immediate
+            sr2 = register_get(tokens[3])
+            if sr2 is not None:
+                # Register mode
+                return base | (dr << 9) | (sr1 << 6) | sr2
+            # Immediate mode
+            imm = self.parse_immediate(tokens[3])
+            if not -16 <= imm <= 15:
+                self.error("%s immediate value out of range: %s", name, imm)
+            return base | (dr << 9) | (sr1 << 6) | (1 << 5) | (imm & 0x1F)
+            
+        return encode
+        
+    def _make_pc_rel9(self, opcode: int, name: str) -> Callable[[List[str]], int]:
+        """Build the encoder for LD/ST/LDI/STI/LEA: register, then PCoffset9"""
+        base = opcode << 12
+        parse_register = self.parse_register
+        resolve_offset = self._resolve_offset
+        symbol_get = self.symbol_table.get
+        
+        def encode(tokens: List[str]) -> int:
+            if len(tokens) != 3:
+                self.error("%s instruction requires exactly 2 operands", name)
+                
+            r = parse_register(tokens[1])
+            
+            # Fast path: a label already defined within reach
+            address = symbol_get(tokens[2])
+            if address is not None:
+                offset = address - (self.pc + 1)
+                if -256 <= offset <= 255:
+                    return base | (r << 9) | (offset & 0x1FF)
+                    
+            return base | (r << 9) | resolve_offset(tokens[2], 9, name)
             
-        # If no condition specified, default to unconditional (NZP)
-        if n == 0 and z == 0 and p == 0:
-            n = z = p = 1
+        return encode
+        
+    def _make_base_offset6(self, opcode: int, name: str) -> Callable[[List[str]], int]:
+        """Build the encoder for LDR/STR: register, base register, then offset6"""
+        base = opcode << 12
+        parse_register = self.parse_register
+        
+        def encode(tokens: List[str]) -> int:
+            if len(tokens) != 4:
+                self.error("%s instruction requires exactly 3 operands", name)
+                
+            r = parse_register(tokens[1])
+            base_r = parse_register(tokens[2])
+            offset = self.parse_immediate(tokens[3])
             
-        # Parse offset
-        if tokens[1] in self.symbol_table:
-            offset = self.symbol_table[tokens[1]] - (self.pc + 1)
-        else:
-            try:
-                offset = self.parse_immediate(tokens[1])
-            except:
-                self.error(f"Undefined label or invalid offset: {tokens[1]}")
+            if not -32 <= offset <= 31:
+                self.error("%s offset out of range: %s", name, offset)
                 
-        if not self.check_range(offset, 9):
-            self.error(f"Branch offset out of range: {offset}")
+            return base | (r << 9) | (base_r << 6) | (offset & 0x3F)
             
-        offset = offset & 0x1FF  # 9 bits
-        
-        return (0 << 12) | (n << 11) | (z << 10) | (p << 9) | offset
+        return encode
         
     def assemble_add(self, tokens: List[str]) -> int:
         """Assemble ADD instruction"""
-        if len(tokens) != 4:
-            self.error("ADD instruction requires exactly 3 operands")
-            
-        dr = self.parse_register(tokens[1])
-        sr1 = self.parse_register(tokens[2])
+        return self._instr_dispatch['ADD'](tokens)
         
-        # Check if third operand is register or immediate
-        if self.is_register(tokens[3]):
-            # Register mode
-            sr2 = self.parse_register(tokens[3])
-            return (1 << 12) | (dr << 9) | (sr1 << 6) | sr2
-        else:
-            # Immediate mode
-            imm = self.parse_immediate(tokens[3])
-            if not self.check_range(imm, 5):
-                self.error(f"ADD immediate value out of range: {imm}")
-            imm = imm & 0x1F  # 5 bits
-            return (1 << 12) | (dr << 9) | (sr1 << 6) | (1 << 5) | imm
-            
     def assemble_and(self, tokens: List[str]) -> int:
         """Assemble AND instruction"""
-        if len(tokens) != 4:
-            self.error("AND instruction requires exactly 3 operands")
-            
-        dr = self.parse_register(tokens[1])
-        sr1 = self.parse_register(tokens[2])
+        return self._instr_dispatch['AND'](tokens)
         
-        # Check if third operand is register or immediate
-        if self.is_register(tokens[3]):
-            # Register mode
-            sr2 = self.parse_register(tokens[3])
-            return (5 << 12) | (dr << 9) | (sr1 << 6) | sr2
-        else:
-            # Immediate mode
-            imm = self.parse_immediate(tokens[3])
-            if not self.check_range(imm, 5):
-                self.error(f"AND immediate value out of range: {imm}")
-            imm = imm & 0x1F  # 5 bits
-            return (5 << 12) | (dr << 9) | (sr1 << 6) | (1 << 5) | imm
-            
     def assemble_not(self, tokens: List[str]) -> int:
         """Assemble NOT instruction"""
         if len(tokens) != 3:
@@ -238,169 +409,53 @@ class LC3Assembler:
         
     def assemble_ld(self, tokens: List[str]) -> int:
         """Assemble LD instruction"""
-        if len(tokens) != 3:
-            self.error("LD instruction requires exactly 2 operands")
-            
-        dr = self.parse_register(tokens[1])
-        
-        # Parse offset
-        if tokens[2] in self.symbol_table:
-            offset = self.symbol_table[tokens[2]] - (self.pc + 1)
-        else:
-            offset = self.parse_immediate(tokens[2])
-            
-        if not self.check_range(offset, 9):
-            self.error(f"LD offset out of range: {offset}")
-            
-        offset = offset & 0x1FF  # 9 bits
-        
-        return (2 << 12) | (dr << 9) | offset
+        return self._instr_dispatch['LD'](tokens)
         
     def assemble_st(self, tokens: List[str]) -> int:
         """Assemble ST instruction"""
-        if len(tokens) != 3:
-            self.error("ST instruction requires exactly 2 operands")
-            
-        sr = self.parse_register(tokens[1])
-        
-        # Parse offset
-        if tokens[2] in self.symbol_table:
-            offset = self.symbol_table[tokens[2]] - (self.pc + 1)
-        else:
-            offset = self.parse_immediate(tokens[2])
-            
-        if not self.check_range(offset, 9):
-            self.error(f"ST offset out of range: {offset}")
-            
-        offset = offset & 0x1FF  # 9 bits
-        
-        return (3 << 12) | (sr << 9) | offset
+        return self._instr_dispatch['ST'](tokens)
         
     def assemble_jsr(self, tokens: List[str]) -> int:
         """Assemble JSR/JSRR instruction"""
         if len(tokens) != 2:
             self.error("JSR/JSRR instruction requires exactly 1 operand")
             
-        if tokens[0].upper() == 'JSRR':
+        if tokens[0] == 'JSRR':
             # JSRR - register mode
             base_r = self.parse_register(tokens[1])
             return (4 << 12) | (base_r << 6)
         else:
             # JSR - PC-relative mode
-            if tokens[1] in self.symbol_table:
-                offset = self.symbol_table[tokens[1]] - (self.pc + 1)
-            else:
-                offset = self.parse_immediate(tokens[1])
-                
-            if not self.check_range(offset, 11):
-                self.error(f"JSR offset out of range: {offset}")
-                
-            offset = offset & 0x7FF  # 11 bits
+            offset = self._resolve_offset(tokens[1], 11, "JSR")
             
             return (4 << 12) | (1 << 11) | offset
             
     def assemble_jmp(self, tokens: List[str]) -> int:
-        """Assemble JMP/RET instruction"""
-        if tokens[0].upper() == 'RET':
-            # RET is JMP R7
-            return (12 << 12) | (7 << 6)
-        else:
-            if len(tokens) != 2:
-                self.error("JMP instruction requires exactly 1 operand")
-            base_r = self.parse_register(tokens[1])
-            return (12 << 12) | (base_r << 6)
+        """Assemble JMP instruction (RET is encoded in _instr_dispatch)"""
+        if len(tokens) != 2:
+            self.error("JMP instruction requires exactly 1 operand")
+        base_r = self.parse_register(tokens[1])
+        return (12 << 12) | (base_r << 6)
             
     def assemble_ldr(self, tokens: List[str]) -> int:
         """Assemble LDR instruction"""
-        if len(tokens) != 4:
-            self.error("LDR instruction requires exactly 3 operands")
-            
-        dr = self.parse_register(tokens[1])
-        base_r = self.parse_register(tokens[2])
-        offset = self.parse_immediate(tokens[3])
-        
-        if not self.check_range(offset, 6):
-            self.error(f"LDR offset out of range: {offset}")
-            
-        offset = offset & 0x3F  # 6 bits
-        
-        return (6 << 12) | (dr << 9) | (base_r << 6) | offset
+        return self._instr_dispatch['LDR'](tokens)
         
     def assemble_str(self, tokens: List[str]) -> int:
         """Assemble STR instruction"""
-        if len(tokens) != 4:
-            self.error("STR instruction requires exactly 3 operands")
-            
-        sr = self.parse_register(tokens[1])
-        base_r = self.parse_register(tokens[2])
-        offset = self.parse_immediate(tokens[3])
-        
-        if not self.check_range(offset, 6):
-            self.error(f"STR offset out of range: {offset}")
-            
-        offset = offset & 0x3F  # 6 bits
-        
-        return (7 << 12) | (sr << 9) | (base_r << 6) | offset
+        return self._instr_dispatch['STR'](tokens)
         
     def assemble_ldi(self, tokens: List[str]) -> int:
         """Assemble LDI instruction"""
-        if len(tokens) != 3:
-            self.error("LDI instruction requires exactly 2 operands")
-            
-        dr = self.parse_register(tokens[1])
-        
-        # Parse offset
-        if tokens[2] in self.symbol_table:
-            offset = self.symbol_table[tokens[2]] - (self.pc + 1)
-        else:
-            offset = self.parse_immediate(tokens[2])
-            
-        if not self.check_range(offset, 9):
-            self.error(f"LDI offset out of range: {offset}")
-            
-        offset = offset & 0x1FF  # 9 bits
-        
-        return (10 << 12) | (dr << 9) | offset
+        return self._instr_dispatch['LDI'](tokens)
         
     def assemble_sti(self, tokens: List[str]) -> int:
         """Assemble STI instruction"""
-        if len(tokens) != 3:
-            self.error("STI instruction requires exactly 2 operands")
-            
-        sr = self.parse_register(tokens[1])
-        
-        # Parse offset
-        if tokens[2] in self.symbol_table:
-            offset = self.symbol_table[tokens[2]] - (self.pc + 1)
-        else:
-            offset = self.parse_immediate(tokens[2])
-            
-        if not self.check_range(offset, 9):
-            self.error(f"STI offset out of range: {offset}")
-            
-        offset = offset & 0x1FF  # 9 bits
-        
-        return (11 << 12) | (sr << 9) | offset
+        return self._instr_dispatch['STI'](tokens)
         
     def assemble_lea(self, tokens: List[str]) -> int:
         """Assemble LEA instruction"""
-        if len(tokens) != 3:
-            self.error("LEA instruction requires exactly 2 operands")
-            
-        dr = self.parse_register(tokens[1])
-        
-        # Parse offset
-        if tokens[2] in self.symbol_table:
-            offset = self.symbol_table[tokens[2]] - (self.pc + 1)
-        else:
-            offset = self.parse_immediate(tokens[2])
-            
-        if not self.check_range(offset, 9):
-            self.error(f"LEA offset out of range: {offset}")
-            
-        offset = offset & 0x1FF  # 9 bits
-        
-        return (14 << 12) | (dr << 9) | offset
+        return self._instr_dispatch['LEA'](tokens)
         
     def assemble_trap(self, tokens: List[str]) -> int:
         """Assemble TRAP instruction"""
@@ -408,14 +463,12 @@ class LC3Assembler:
             self.error("TRAP instruction requires exactly 1 operand")
             
         # Check if it's a named trap
-        trap_name = tokens[1].upper()
-        if trap_name in self.trap_vectors:
-            trap_vector = self.trap_vectors[trap_name]
-        else:
+        trap_vector = _TRAP_VECTORS.get(tokens[1].upper())
+        if trap_vector is None:
             trap_vector = self.parse_immediate(tokens[1])
             
-        if not self.check_range(trap_vector, 8, signed=False):
-            self.error(f"TRAP vector out of range: {trap_vector}")
+        if not 0 <= trap_vector <= 0xFF:
+            self.error("TRAP vector out of range: %s", trap_vector)
             
         return (15 << 12) | (trap_vector & 0xFF)
         
@@ -427,63 +480,53 @@ class LC3Assembler:
         
     def assemble_instruction(self, tokens: List[str]) -> int:
         """Assemble a single instruction"""
-        opcode = tokens[0].upper()
-        
-        if opcode.startswith('BR'):
-            return self.assemble_br(tokens)
-        elif opcode == 'ADD':
-            return self.assemble_add(tokens)
-        elif opcode == 'AND':
-            return self.assemble_and(tokens)
-        elif opcode == 'NOT':
-            return self.assemble_not(tokens)
-        elif opcode == 'LD':
-            return self.assemble_ld(tokens)
-        elif opcode == 'ST':
-            return self.assemble_st(tokens)
-        elif opcode in ['JSR', 'JSRR']:
-            return self.assemble_jsr(tokens)
-        elif opcode in ['JMP', 'RET']:
-            return self.assemble_jmp(tokens)
-        elif opcode == 'LDR':
-            return self.assemble_ldr(tokens)
-        elif opcode == 'STR':
-            return self.assemble_str(tokens)
-        elif opcode == 'LDI':
-            return self.assemble_ldi(tokens)
-        elif opcode == 'STI':
-            return self.assemble_sti(tokens)
-        elif opcode == 'LEA':
-            return self.assemble_lea(tokens)
-        elif opcode == 'TRAP' or opcode in self.trap_vectors:
-            if opcode in self.trap_vectors:
-                # Handle named traps like HALT, GETC, etc.
-                return self.assemble_trap(['TRAP', opcode])
-            else:
-                return self.assemble_trap(tokens)
-        elif opcode == 'RTI':
-            return self.assemble_rti(tokens)
-        else:
-            self.error(f"Unknown instruction: {opcode}")
-            
-    def process_directive(self, tokens: List[str]) -> Optional[int]:
-        """Process assembler directives"""
-        directive = tokens[0].upper()
+        opcode = tokens[0]
+        
+        handler = self._instr_dispatch.get(opcode)
+        if handler is None:
+            self.error("Unknown instruction: %s", opcode)
+        return handler(tokens)
+            
+    def parse_stringz(self, tokens: List[str]) -> List[int]:
+        """Decode a .STRINGZ operand into null-terminated character codes"""
+        if len(tokens) < 2:
+            self.error(".STRINGZ directive requires a string operand")
+        # Join all tokens after the directive to handle strings with spaces
+        string_content = ' '.join(tokens[1:])
+        if not (string_content.startswith('"') and string_content.endswith('"')):
+            self.error(".STRINGZ string must be enclosed in double quotes")
+        string_content = string_content[1:-1]  # Remove quotes
+        
+        # Decode escape sequences with one regex substitution, then convert to character codes
+        if '\\' in string_content:
+            string_content = _ESCAPE_RE.sub(_decode_escape, string_content)
+        result = list(map(ord, string_content))
+        result.append(0)  # Null terminator
+        return result
+        
+    def _emit_directive(self, tokens: List[str], data: Optional[array.array]) -> None:
+        """Process an assembler directive, writing any words it produces straight into memory"""
+        directive = tokens[0]
         
         if directive == '.ORIG':
             if len(tokens) != 2:
                 self.error(".ORIG directive requires exactly 1 operand")
             self.origin = self.parse_immediate(tokens[1])
             self.pc = self.origin
-            return None
             
         elif directive == '.FILL':
             if len(tokens) != 2:
                 self.error(".FILL directive requires exactly 1 operand")
-            if tokens[1] in self.symbol_table:
-                return self.symbol_table[tokens[1]]
-            else:
-                return self.parse_immediate(tokens[1]) & 0xFFFF
+            value = self.symbol_table.get(tokens[1])
+            if value is None:
+                if tokens[1].isidentifier():
+                    # Possibly a forward label reference: patch in its address later
+                    self._fixups.append((len(self.memory), tokens[1], None, self.pc, ".FILL", self.line_number))
+                    value = 0
+                else:
+                    value = self.parse_immediate(tokens[1]) & 0xFFFF
+            self.memory.append(value & 0xFFFF)
+            self.pc += 1
                 
         elif directive == '.BLKW':
             if len(tokens) != 2:
@@ -491,163 +534,185 @@ class LC3Assembler:
             count = self.parse_immediate(tokens[1])
             if count < 0:
                 self.error(".BLKW count must be non-negative")
-            # Return a list of zeros
-            return [0] * count
+            # Zero-filled block
+            self.memory.frombytes(bytes(2 * count))
+            self.pc += count
             
         elif directive == '.STRINGZ':
-            if len(tokens) < 2:
-                self.error(".STRINGZ directive requires a string operand")
-            # Join all tokens after the directive to handle strings with spaces
-            string_content = ' '.join(tokens[1:])
-            if not (string_content.startswith('"') and string_content.endswith('"')):
-                self.error(".STRINGZ string must be enclosed in double quotes")
-            string_content = string_content[1:-1]  # Remove quotes
-            
-            # Convert string to list of character codes
-            result = []
-            i = 0
-            while i < len(string_content):
-                if string_content[i] == '\\' and i + 1 < len(string_content):
-                    # Handle escape sequences
-                    if string_content[i + 1] == 'n':
-                        result.append(ord('\n'))
-                    elif string_content[i + 1] == 't':
-                        result.append(ord('\t'))
-                    elif string_content[i + 1] == 'r':
-                        result.append(ord('\r'))
-                    elif string_content[i + 1] == '\\':
-                        result.append(ord('\\'))
-                    elif string_content[i + 1] == '"':
-                        result.append(ord('"'))
-                    else:
-                        result.append(ord(string_content[i + 1]))
-                    i += 2
-                else:
-                    result.append(ord(string_content[i]))
-                    i += 1
-            result.append(0)  # Null terminator
-            return result
+            # Packed once by tokenize_all
+            if data is None:
+                data = self.pack_words(self.parse_stringz(tokens))
+            self.memory.extend(data)
+            self.pc += len(data)
             
-        elif directive == '.END':
-            return None
+        elif directive != '.END':
+            self.error("Unknown directive: %s", directive)
             
-        else:
-            self.error(f"Unknown directive: {directive}")
+    def pack_words(self, words: List[int]) -> array.array:
+        """Pack words into a 16-bit array"""
+        try:
+            # Straight from the list in C when every word already fits
+            return array.array('H', words)
+        except OverflowError:
+            return array.array('H', [word & 0xFFFF for word in words])
+        
+    def iter_lines(self, source: Union[io.BytesIO, mmap.mmap]) -> Iterator[str]:
+        """Yield each source line, decoding it straight from the buffer"""
+        # Same encoding open(input_file, 'r') would use
+        encoding = locale.getpreferredencoding(False)
+        # readline finds each line in C; the trailing newline is left on
+        # since tokenize_line splits on whitespace anyway
+        source.seek(0)
+        for line in iter(source.readline, b''):
+            if b'\r' in line.rstrip(b'\r\n'):
+                # CR-only line endings: split like universal newlines would
+                for part in line.splitlines():
+                    yield part.decode(encoding)
+            else:
+                yield line.decode(encoding)
             
-    def first_pass(self, lines: List[str]) -> None:
-        """First pass: build symbol table"""
-        self.pc = self.origin
+    def tokenize_all(self, lines: Iterable[str]) -> Iterator[_ParsedLine]:
+        """Tokenize each source line once, yielding (line_number, label, tokens, kind, data)
         
-        for line_num, line in enumerate(lines):
-            self.line_number = line_num + 1
-            
-            # Skip empty lines and comments
-            line = line.strip()
-            if not line or line.startswith(';'):
-                continue
-                
-            tokens = self.tokenize_line(line)
-            if not tokens:
-                continue
-                
-            # Check for label
-            if tokens[0].endswith(':'):
-                label = tokens[0][:-1]
-                if label in self.symbol_table:
-                    self.error(f"Duplicate label: {label}")
-                self.symbol_table[label] = self.pc
-                tokens = tokens[1:]  # Remove label from tokens
-                
-            if not tokens:
-                continue
-                
-            # Check if it's a directive
-            if tokens[0].startswith('.'):
-                if tokens[0].upper() == '.ORIG':
-                    self.origin = self.parse_immediate(tokens[1])
-                    self.pc = self.origin
-                elif tokens[0].upper() == '.BLKW':
-                    count = self.parse_immediate(tokens[1])
-                    self.pc += count
-                elif tokens[0].upper() == '.STRINGZ':
-                    string_content = ' '.join(tokens[1:])
-                    if string_content.startswith('"') and string_content.endswith('"'):
-                        string_content = string_content[1:-1]
-                        # Count characters (including escape sequences)
-                        char_count = 0
-                        i = 0
-                        while i < len(string_content):
-                            if string_content[i] == '\\' and i + 1 < len(string_content):
-                                i += 2
-                            else:
-                                i += 1
-                            char_count += 1
-                        self.pc += char_count + 1  # +1 for null terminator
-                    else:
-                        self.pc += 1  # Assume single word for error recovery
-                elif tokens[0].upper() in ['.FILL', '.END']:
-                    if tokens[0].upper() == '.FILL':
-                        self.pc += 1
-                else:
-                    self.error(f"Unknown directive: {tokens[0]}")
-            else:
-                # It's an instruction
-                self.pc += 1
-                
-    def second_pass(self, lines: List[str]) -> None:
-        """Second pass: generate machine code"""
-        self.pc = self.origin
-        self.memory = []
+        data is the packed .STRINGZ words for directives or the resolved
+        encoder for instructions.
+        """
+        # Hoist attribute lookups out of the per-line loop
+        tokenize = self.tokenize_line
+        canonicalize = self.canonicalize_tokens
+        intern = sys.intern
+        dispatch_get = self._instr_dispatch.get
         
         for line_num, line in enumerate(lines):
             self.line_number = line_num + 1
             
-            # Skip empty lines and comments
-            line = line.strip()
-            if not line or line.startswith(';'):
-                continue
-                
-            tokens = self.tokenize_line(line)
+            tokens = tokenize(line)
             if not tokens:
                 continue
                 
-            # Skip label
+            # Split off label
+            label = None
             if tokens[0].endswith(':'):
+                label = intern(tokens[0][:-1])
                 tokens = tokens[1:]
                 
-            if not tokens:
-                continue
+            kind = None
+            data = None
+            if tokens:
+                if tokens[0].startswith('.'):
+                    kind = TokenType.DIRECTIVE
+                    tokens[0] = tokens[0].upper()
+                    # Decode strings once, up front
+                    if tokens[0] == '.STRINGZ':
+                        data = self.pack_words(self.parse_stringz(tokens))
+                    elif tokens[0] == '.FILL' and len(tokens) > 1:
+                        tokens[1] = intern(tokens[1])
+                else:
+                    kind = TokenType.INSTRUCTION
+                    tokens = canonicalize(tokens)
+                    # Resolve the encoder once, here, rather than per pass
+                    data = dispatch_get(tokens[0])
+                    
+            yield self.line_number, label, tokens, kind, data
+            
+    def assemble_pass(self, parsed: Iterable[_ParsedLine]) -> None:
+        """Build the symbol table and generate machine code in a single pass"""
+        self.pc = self.origin
+        self.memory = array.array('H')
+        self._fixups = []
+        self._code_indices = array.array('L')
+        
+        # Hoist attribute lookups out of the per-line loop
+        memory = self.memory
+        append = memory.append
+        record_code = self._code_indices.append if self.optimize else None
+        symbol_table = self.symbol_table
+        emit_directive = self._emit_directive
+        DIRECTIVE = TokenType.DIRECTIVE
+        INSTRUCTION = TokenType.INSTRUCTION
+        
+        for self.line_number, label, tokens, kind, data in parsed:
+            # Record label
+            if label is not None:
+                if label in symbol_table:
+                    self.error("Duplicate label: %s", label)
+                symbol_table[label] = self.pc
                 
             # Process directive or instruction
-            if tokens[0].startswith('.'):
-                result = self.process_directive(tokens)
-                if result is not None:
-                    if isinstance(result, list):
-                        self.memory.extend(result)
-                        self.pc += len(result)
-                    else:
-                        self.memory.append(result)
-                        self.pc += 1
-            else:
-                # Assemble instruction
-                machine_code = self.assemble_instruction(tokens)
-                self.memory.append(machine_code)
+            if kind is DIRECTIVE:
+                emit_directive(tokens, data)
+            elif kind is INSTRUCTION:
+                # Assemble instruction with the encoder resolved at tokenize time
+                if data is None:
+                    self.error("Unknown instruction: %s", tokens[0])
+                if record_code is not None:
+                    record_code(len(memory))
+                append(data(tokens))
                 self.pc += 1
                 
+    def apply_fixups(self) -> None:
+        """Patch forward label references now that every label is known"""
+        # Hoist attribute lookups out of the per-fixup loop
+        symbol_get = self.symbol_table.get
+        memory = self.memory
+        check_offset = self._check_offset
+        
+        for index, label, bits, pc, name, self.line_number in self._fixups:
+            address = symbol_get(label)
+            if bits is None:
+                # Absolute address (.FILL)
+                value = (address if address is not None else self.parse_immediate(label)) & 0xFFFF
+            else:
+                if address is not None:
+                    value = address - (pc + 1)
+                else:
+                    # Not a label after all; identifiers such as x1F are also numbers
+                    value = _try_parse_number(label)
+                    if value is None:
+                        self.error("Undefined label or invalid offset: %s", label)
+                value = check_offset(value, bits, name)
+            memory[index] |= value
+        self._fixups = []
+        
+    def peephole(self) -> None:
+        """Rewrite instruction words matching _PEEPHOLE_RULES in place"""
+        memory = self.memory
+        for index in self._code_indices:
+            word = memory[index]
+            for mask, value, replacement in _PEEPHOLE_RULES:
+                if word & mask == value:
+                    memory[index] = replacement
+                    break
+                    
     def assemble_file(self, input_file: str, output_file: str) -> None:
         """Assemble a file"""
         try:
-            with open(input_file, 'r') as f:
-                lines = f.readlines()
+            with open(input_file, 'rb') as f:
+                # Map the source rather than materializing every line up front.
+                # Only non-empty regular files can be mapped; pipes and the
+                # like report a size of 0, so read those in full instead.
+                st = os.fstat(f.fileno())
+                if stat.S_ISREG(st.st_mode) and st.st_size:
+                    source = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    source = io.BytesIO(f.read())
         except IOError as e:
             print(f"Error reading input file: {e}", file=sys.stderr)
             sys.exit(1)
             
-        # First pass: build symbol table
-        self.first_pass(lines)
+        # Single pass: tokenize, build symbol table and generate machine code
+        # while streaming lines, so no intermediate list of lines is kept
+        try:
+            self.assemble_pass(self.tokenize_all(self.iter_lines(source)))
+        finally:
+            if isinstance(source, mmap.mmap):
+                source.close()
+        
+        # Backpatch references to labels defined after their use
+        self.apply_fixups()
         
-        # Second pass: generate machine code
-        self.second_pass(lines)
+        if self.optimize:
+            self.peephole()
         
         # Write output file
         self.write_obj_file(output_file)
@@ -655,13 +720,18 @@ class LC3Assembler:
     def write_obj_file(self, filename: str) -> None:
         """Write object file in LC-3 format"""
         try:
+            # Origin header followed by machine code. The image is swapped to
+            # big-endian in place (and back afterwards) instead of copied.
+            swap = sys.byteorder == 'little'
             with open(filename, 'wb') as f:
-                # Write origin (big-endian)
-                f.write(struct.pack('>H', self.origin))
-                
-                # Write machine code (big-endian)
-                for word in self.memory:
-                    f.write(struct.pack('>H', word & 0xFFFF))
+                f.write(self.origin.to_bytes(2, 'big'))
+                if swap:
+                    self.memory.byteswap()
+                try:
+                    f.write(self.memory)
+                finally:
+                    if swap:
+                        self.memory.byteswap()
                     
         except IOError as e:
             print(f"Error writing output file: {e}", file=sys.stderr)
@@ -674,14 +744,20 @@ class LC3Assembler:
             print(f"  {symbol}: x{address:04X}")
             
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: python lc3_assembler.py <input.asm> <output.obj>", file=sys.stderr)
+    args = sys.argv[1:]
+    optimize = '-O' in args
+    if optimize:
+        args.remove('-O')
+        
+    if len(args) != 2:
+        print("Usage: python lc3_assembler.py [-O] <input.asm> <output.obj>", file=sys.stderr)
         sys.exit(1)
         
-    input_file = sys.argv[1]
-    output_file = sys.argv[2]
+    input_file = args[0]
+    output_file = args[1]
     
     assembler = LC3Assembler()
+    assembler.optimize = optimize
     
     try:
         assembler.assemble_file(input_file, output_file)
@@ -1,16 +1,36 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
-import struct
+import array
+import sys
 import threading
 import time
-from typing import Dict, Set, Optional, List, Tuple
+from collections import deque
+from typing import Deque, Dict, Set, Optional, List, Tuple
+
+# Mnemonics for the disassembler, indexed by opcode (instr >> 12)
+_OPCODE_NAMES = (
+    "BR", "ADD", "LD", "ST", "JSR", "AND", "LDR", "STR",
+    "RTI", "NOT", "LDI", "STI", "JMP", "RES", "LEA", "TRAP"
+)
+
+# Register file indices used on the hot path (same as LC3VirtualMachine.R_PC/R_COND)
+_R_PC, _R_COND = 8, 9
+
+# Condition code for every 16-bit result: Z for 0, P for 1..0x7FFF, N for the rest
+_COND_FLAGS = bytes([2]) + bytes([1]) * 0x7FFF + bytes([4]) * 0x8000
+
+# Names of the standard trap vectors
+_TRAP_NAMES = {
+    0x20: "GETC", 0x21: "OUT", 0x22: "PUTS",
+    0x23: "IN", 0x24: "PUTSP", 0x25: "HALT"
+}
 
 class LC3VirtualMachine:
     
     def __init__(self):
-        # Memory
+        # Memory: packed 16-bit words rather than a list of int objects
         self.MAX_MEMORY = 1 << 16
-        self.memory = [0] * self.MAX_MEMORY
+        self.memory = array.array('H', bytes(2 * self.MAX_MEMORY))
         
         # Registers
         self.R_R0, self.R_R1, self.R_R2, self.R_R3 = 0, 1, 2, 3
@@ -39,31 +59,41 @@ class LC3VirtualMachine:
         self.running = False
         self.halted = False
         self.breakpoints: Set[int] = set()
+        # One byte per address mirroring breakpoints, for the per-step check
+        self._bp_mask = bytearray(1 << 16)
         self.step_mode = False
-        self.output_buffer = []
-        self.input_buffer = []
+        self.output_buffer = bytearray()  # latin-1 bytes, decoded by the GUI
+        self.input_buffer: Deque[str] = deque()
         self.wait_for_input = False  # New flag for input waiting
         
+        # Decoded instruction cache, indexed by the instruction word itself:
+        # (handler, a, b, c) with operands already extracted and sign-extended.
+        # Decoding depends only on the word, so entries never go stale.
+        self._decoded: List[Optional[Tuple]] = [None] * (1 << 16)
+        
         # Initialize
         self.reset()
     
     def reset(self):
         """Reset the virtual machine to initial state"""
-        self.memory = [0] * self.MAX_MEMORY
+        self.memory = array.array('H', bytes(2 * self.MAX_MEMORY))
         self.reg = [0] * self.R_COUNT
         self.reg[self.R_COND] = self.FL_ZERO
-        self.reg[self.R_PC] = 0x3000
+        # PC lives in its own attribute while executing; reg[R_PC] is a copy
+        # refreshed after each step()/run_batch() for display
+        self.pc = self.reg[self.R_PC] = 0x3000
         self.running = False
         self.halted = False
-        self.output_buffer = []
-        self.input_buffer = []
+        self.output_buffer = bytearray()
+        self.input_buffer = deque()
         self.wait_for_input = False  # Reset input wait flag
     
     def sign_extend(self, x: int, num_bits: int) -> int:
-        """Sign extend a value to 16 bits"""
-        if (x >> (num_bits - 1)) & 1:
-            x |= (0xFFFF << num_bits)
-        return x & 0xFFFF
+        """Sign extend a num_bits-wide value to 16 bits"""
+        # Branchless: flipping the sign bit and subtracting it back borrows
+        # through the upper bits exactly when the sign bit was set
+        m = 1 << (num_bits - 1)
+        return ((x ^ m) - m) & 0xFFFF
     
     def update_flags(self, r: int):
         """Update condition flags based on register value"""
@@ -78,13 +108,26 @@ class LC3VirtualMachine:
         """Swap bytes for endianness conversion"""
         return ((x << 8) | (x >> 8)) & 0xFFFF
     
+    def add_breakpoint(self, address: int):
+        """Set a breakpoint at address"""
+        self.breakpoints.add(address)
+        self._bp_mask[address] = 1
+    
+    def remove_breakpoint(self, address: int):
+        """Clear the breakpoint at address, if any"""
+        self.breakpoints.discard(address)
+        self._bp_mask[address] = 0
+    
     def mem_read(self, address: int) -> int:
         """Read from memory with memory-mapped I/O handling"""
         address &= 0xFFFF
+        if address < self.MR_KBSR:
+            # Ordinary RAM; only the device register page needs special handling
+            return self.memory[address]
         if address == self.MR_KBSR:
             if self.input_buffer:
                 self.memory[self.MR_KBSR] = 1 << 15
-                self.memory[self.MR_KBDR] = ord(self.input_buffer.pop(0))
+                self.memory[self.MR_KBDR] = ord(self.input_buffer.popleft()) & 0xFFFF
             else:
                 self.memory[self.MR_KBSR] = 0
         return self.memory[address]
@@ -100,232 +143,273 @@ class LC3VirtualMachine:
         if len(data) < 2:
             return False
         
-        try:
-            # Read origin address
-            origin = struct.unpack('>H', data[:2])[0]  # Big-endian
-            
-            # Load program data
-            program_data = data[2:]
-            words = len(program_data) // 2
-            
-            for i in range(words):
-                if origin + i >= self.MAX_MEMORY:
-                    break
-                word = struct.unpack('>H', program_data[i*2:(i+1)*2])[0]
-                self.memory[origin + i] = word
-            
-            self.reg[self.R_PC] = origin
-            
-            return True
-        except:
-            return False
+        # Read origin address
+        origin = int.from_bytes(data[:2], 'big')
+        
+        # Load program data in one copy, truncated at the top of memory
+        count = min((len(data) - 2) // 2, self.MAX_MEMORY - origin)
+        words = array.array('H')
+        words.frombytes(data[2:2 + 2 * count])
+        if sys.byteorder == 'little':
+            words.byteswap()  # big-endian on disk
+        self.memory[origin:origin + count] = words
+        
+        self.pc = self.reg[self.R_PC] = origin
+        
+        return True
     
     def step(self) -> bool:
         """Execute one instruction and return True if continuing"""
+        result = self._step()
+        self.reg[_R_PC] = self.pc
+        return result
+    
+    def _step(self) -> bool:
+        """step() without publishing PC to the register file"""
         if self.halted or self.wait_for_input:
             return False
         
+        pc = self.pc
+        
         # Check for breakpoint
-        if self.reg[self.R_PC] in self.breakpoints and not self.step_mode:
+        if self._bp_mask[pc] and not self.step_mode:
             return False
         
-        # Fetch instruction and increment PC (LC-3 spec)
-        instr = self.mem_read(self.reg[self.R_PC])
-        self.reg[self.R_PC] = (self.reg[self.R_PC] + 1) & 0xFFFF
+        # Fetch instruction and increment PC (LC-3 spec); code almost never
+        # lives in the device register page, so read RAM directly
+        instr = self.memory[pc] if pc < 0xFE00 else self.mem_read(pc)
+        self.pc = (pc + 1) & 0xFFFF
+        
+        # Decode (once per distinct instruction word) and execute
+        entry = self._decoded[instr]
+        if entry is None:
+            entry = self._decoded[instr] = self._decode(instr)
+        handler, a, b, c = entry
+        trap_result = handler(a, b, c)
+        if trap_result is None:
+            # Fast path: every handler except TRAP returns None
+            return True
         
-        # Decode and execute
+        # TRAP: may need input or halt the machine
+        if trap_result == 'WAIT_FOR_INPUT':
+            self.wait_for_input = True
+            # Undo PC increment so the TRAP is re-executed after input
+            self.pc = pc
+            return False
+        if trap_result is False:
+            self.halted = True
+            return False
+        
+        return True
+    
+    def run_batch(self, max_steps: int) -> bool:
+        """Execute up to max_steps instructions and return True if all of them ran
+        
+        Stops early (returning False) when the program halts, waits for input
+        or reaches a breakpoint.
+        """
+        # Hoist attribute lookups out of the per-instruction loop
+        step = self._step
+        bp_mask = self._bp_mask
+        
+        completed = True
+        for _ in range(max_steps):
+            if not step() or bp_mask[self.pc]:
+                completed = False
+                break
+        self.reg[_R_PC] = self.pc
+        return completed
+    
+    def _decode(self, instr: int) -> Tuple:
+        """Decode an instruction word into (handler, a, b, c)"""
         op = instr >> 12
+        r0 = (instr >> 9) & 0x7
+        r1 = (instr >> 6) & 0x7
         
         if op == self.BR:
-            self._execute_br(instr)
-        elif op == self.ADD:
-            self._execute_add(instr)
+            return (self._execute_br, r0, self.sign_extend(instr & 0x1FF, 9), 0)
+        elif op == self.ADD or op == self.AND:
+            if (instr >> 5) & 0x1:
+                handler = self._execute_add_imm if op == self.ADD else self._execute_and_imm
+                return (handler, r0, r1, self.sign_extend(instr & 0x1F, 5))
+            handler = self._execute_add_reg if op == self.ADD else self._execute_and_reg
+            return (handler, r0, r1, instr & 0x7)
         elif op == self.LD:
-            self._execute_ld(instr)
+            return (self._execute_ld, r0, self.sign_extend(instr & 0x1FF, 9), 0)
         elif op == self.ST:
-            self._execute_st(instr)
+            return (self._execute_st, r0, self.sign_extend(instr & 0x1FF, 9), 0)
         elif op == self.JSR:
-            self._execute_jsr(instr)
-        elif op == self.AND:
-            self._execute_and(instr)
+            if (instr >> 11) & 0x1:
+                return (self._execute_jsr, self.sign_extend(instr & 0x7FF, 11), 0, 0)
+            return (self._execute_jsrr, r1, 0, 0)
         elif op == self.LDR:
-            self._execute_ldr(instr)
+            return (self._execute_ldr, r0, r1, self.sign_extend(instr & 0x3F, 6))
         elif op == self.STR:
-            self._execute_str(instr)
-        elif op == self.RTI:
-            pass  # Not implemented
+            return (self._execute_str, r0, r1, self.sign_extend(instr & 0x3F, 6))
         elif op == self.NOT:
-            self._execute_not(instr)
+            return (self._execute_not, r0, r1, 0)
         elif op == self.LDI:
-            self._execute_ldi(instr)
+            return (self._execute_ldi, r0, self.sign_extend(instr & 0x1FF, 9), 0)
         elif op == self.STI:
-            self._execute_sti(instr)
+            return (self._execute_sti, r0, self.sign_extend(instr & 0x1FF, 9), 0)
         elif op == self.JMP:
-            self._execute_jmp(instr)
-        elif op == self.RES:
-            pass  # Reserved
+            return (self._execute_jmp, r1, 0, 0)
         elif op == self.LEA:
-            self._execute_lea(instr)
+            return (self._execute_lea, r0, self.sign_extend(instr & 0x1FF, 9), 0)
         elif op == self.TRAP:
-            trap_result = self._execute_trap(instr)
-            if trap_result == 'WAIT_FOR_INPUT':
-                self.wait_for_input = True
-                # Undo PC increment so the TRAP is re-executed after input
-                self.reg[self.R_PC] = (self.reg[self.R_PC]-1) & 0xFFFF
-                return False
-            if trap_result is False:
-                self.halted = True
-                return False
-        
-        return True
-    
-    def _execute_br(self, instr: int):
-        """Execute branch instruction"""
-        pc_offset = self.sign_extend(instr & 0x1FF, 9)
-        condition_flag = (instr >> 9) & 0x7
-        if self.reg[self.R_COND] & condition_flag:
-            self.reg[self.R_PC] = (self.reg[self.R_PC] + pc_offset) & 0xFFFF
+            return (self._execute_trap, instr & 0xFF, 0, 0)
+        # RTI (not implemented) and RES (reserved)
+        return (self._execute_nop, 0, 0, 0)
     
-    def _execute_add(self, instr: int):
-        """Execute add instruction"""
-        r0 = (instr >> 9) & 0x7
-        r1 = (instr >> 6) & 0x7
-        imm_flag = (instr >> 5) & 0x1
-        
-        if imm_flag:
-            imm5 = self.sign_extend(instr & 0x1F, 5)
-            self.reg[r0] = (self.reg[r1] + imm5) & 0xFFFF
-        else:
-            r2 = instr & 0x7
-            self.reg[r0] = (self.reg[r1] + self.reg[r2]) & 0xFFFF
-        
-        self.update_flags(r0)
+    def _execute_nop(self, a: int, b: int, c: int):
+        """Execute an unimplemented or reserved opcode as a no-op"""
+        pass
     
-    def _execute_ld(self, instr: int):
+    def _execute_br(self, condition_flag: int, pc_offset: int, _c: int):
+        """Execute branch instruction"""
+        if self.reg[_R_COND] & condition_flag:
+            self.pc = (self.pc + pc_offset) & 0xFFFF
+    
+    def _execute_add_imm(self, r0: int, r1: int, imm5: int):
+        """Execute add instruction (immediate mode)"""
+        reg = self.reg
+        reg[r0] = value = (reg[r1] + imm5) & 0xFFFF
+        reg[_R_COND] = _COND_FLAGS[value]
+    
+    def _execute_add_reg(self, r0: int, r1: int, r2: int):
+        """Execute add instruction (register mode)"""
+        reg = self.reg
+        reg[r0] = value = (reg[r1] + reg[r2]) & 0xFFFF
+        reg[_R_COND] = _COND_FLAGS[value]
+    
+    def _execute_ld(self, r0: int, pc_offset: int, _c: int):
         """Execute load instruction"""
-        r0 = (instr >> 9) & 0x7
-        pc_offset = self.sign_extend(instr & 0x1FF, 9)
-        self.reg[r0] = self.mem_read((self.reg[self.R_PC] + pc_offset) & 0xFFFF)
-        self.update_flags(r0)
+        reg = self.reg
+        reg[r0] = value = self.mem_read((self.pc + pc_offset) & 0xFFFF)
+        reg[_R_COND] = _COND_FLAGS[value]
     
-    def _execute_st(self, instr: int):
+    def _execute_st(self, r0: int, pc_offset: int, _c: int):
         """Execute store instruction"""
-        r0 = (instr >> 9) & 0x7
-        pc_offset = self.sign_extend(instr & 0x1FF, 9)
-        self.mem_write((self.reg[self.R_PC] + pc_offset) & 0xFFFF, self.reg[r0])
-    
-    def _execute_jsr(self, instr: int):
-        """Execute jump to subroutine instruction"""
-        flag = (instr >> 11) & 0x1
-        self.reg[self.R_R7] = self.reg[self.R_PC]
-        if flag:
-            self.reg[self.R_PC] = (self.reg[self.R_PC] + self.sign_extend(instr & 0x7FF, 11)) & 0xFFFF
-        else:
-            r1 = (instr >> 6) & 0x7
-            self.reg[self.R_PC] = self.reg[r1]
-    
-    def _execute_and(self, instr: int):
-        """Execute bitwise AND instruction"""
-        r0 = (instr >> 9) & 0x7
-        r1 = (instr >> 6) & 0x7
-        imm_flag = (instr >> 5) & 0x1
-        
-        if imm_flag:
-            imm5 = self.sign_extend(instr & 0x1F, 5)
-            self.reg[r0] = (self.reg[r1] & imm5) & 0xFFFF
-        else:
-            r2 = instr & 0x7
-            self.reg[r0] = (self.reg[r1] & self.reg[r2]) & 0xFFFF
-        
-        self.update_flags(r0)
-    
-    def _execute_ldr(self, instr: int):
+        self.mem_write((self.pc + pc_offset) & 0xFFFF, self.reg[r0])
+    
+    def _execute_jsr(self, pc_offset: int, _b: int, _c: int):
+        """Execute jump to subroutine instruction (PC-relative)"""
+        pc = self.pc
+        self.reg[self.R_R7] = pc
+        self.pc = (pc + pc_offset) & 0xFFFF
+    
+    def _execute_jsrr(self, r1: int, _b: int, _c: int):
+        """Execute jump to subroutine instruction (base register)"""
+        self.reg[self.R_R7] = self.pc
+        self.pc = self.reg[r1]
+    
+    def _execute_and_imm(self, r0: int, r1: int, imm5: int):
+        """Execute bitwise AND instruction (immediate mode)"""
+        reg = self.reg
+        reg[r0] = value = (reg[r1] & imm5) & 0xFFFF
+        reg[_R_COND] = _COND_FLAGS[value]
+    
+    def _execute_and_reg(self, r0: int, r1: int, r2: int):
+        """Execute bitwise AND instruction (register mode)"""
+        reg = self.reg
+        reg[r0] = value = (reg[r1] & reg[r2]) & 0xFFFF
+        reg[_R_COND] = _COND_FLAGS[value]
+    
+    def _execute_ldr(self, r0: int, r1: int, offset: int):
         """Execute load register instruction"""
-        r0 = (instr >> 9) & 0x7
-        r1 = (instr >> 6) & 0x7
-        offset = self.sign_extend(instr & 0x3F, 6)
-        self.reg[r0] = self.mem_read((self.reg[r1] + offset) & 0xFFFF)
-        self.update_flags(r0)
+        reg = self.reg
+        reg[r0] = value = self.mem_read((reg[r1] + offset) & 0xFFFF)
+        reg[_R_COND] = _COND_FLAGS[value]
     
-    def _execute_str(self, instr: int):
+    def _execute_str(self, r0: int, r1: int, offset: int):
         """Execute store register instruction"""
-        r0 = (instr >> 9) & 0x7
-        r1 = (instr >> 6) & 0x7
-        offset = self.sign_extend(instr & 0x3F, 6)
         self.mem_write((self.reg[r1] + offset) & 0xFFFF, self.reg[r0])
     
-    def _execute_not(self, instr: int):
+    def _execute_not(self, r0: int, r1: int, _c: int):
         """Execute bitwise NOT instruction"""
-        r0 = (instr >> 9) & 0x7
-        r1 = (instr >> 6) & 0x7
-        self.reg[r0] = (~self.reg[r1]) & 0xFFFF
-        self.update_flags(r0)
+        reg = self.reg
+        reg[r0] = value = (~reg[r1]) & 0xFFFF
+        reg[_R_COND] = _COND_FLAGS[value]
     
-    def _execute_ldi(self, instr: int):
+    def _execute_ldi(self, r0: int, pc_offset: int, _c: int):
         """Execute load indirect instruction"""
-        r0 = (instr >> 9) & 0x7
-        pc_offset = self.sign_extend(instr & 0x1FF, 9)
-        addr = self.mem_read((self.reg[self.R_PC] + pc_offset) & 0xFFFF)
-        self.reg[r0] = self.mem_read(addr)
-        self.update_flags(r0)
+        addr = self.mem_read((self.pc + pc_offset) & 0xFFFF)
+        reg = self.reg
+        reg[r0] = value = self.mem_read(addr)
+        reg[_R_COND] = _COND_FLAGS[value]
     
-    def _execute_sti(self, instr: int):
+    def _execute_sti(self, r0: int, pc_offset: int, _c: int):
         """Execute store indirect instruction"""
-        r0 = (instr >> 9) & 0x7
-        pc_offset = self.sign_extend(instr & 0x1FF, 9)
-        addr = self.mem_read((self.reg[self.R_PC] + pc_offset) & 0xFFFF)
+        addr = self.mem_read((self.pc + pc_offset) & 0xFFFF)
         self.mem_write(addr, self.reg[r0])
     
-    def _execute_jmp(self, instr: int):
+    def _execute_jmp(self, r1: int, _b: int, _c: int):
         """Execute jump instruction"""
-        r1 = (instr >> 6) & 0x7
-        self.reg[self.R_PC] = self.reg[r1]
+        self.pc = self.reg[r1]
     
-    def _execute_lea(self, instr: int):
+    def _execute_lea(self, r0: int, pc_offset: int, _c: int):
         """Execute load effective address instruction"""
-        r0 = (instr >> 9) & 0x7
-        pc_offset = self.sign_extend(instr & 0x1FF, 9)
-        self.reg[r0] = (self.reg[self.R_PC] + pc_offset) & 0xFFFF
-        self.update_flags(r0)
-    
-    def _execute_trap(self, instr: int) -> bool:
+        reg = self.reg
+        reg[r0] = value = (self.pc + pc_offset) & 0xFFFF
+        reg[_R_COND] = _COND_FLAGS[value]
+    
+    def _string_bytes(self, addr: int) -> bytes:
+        """Little-endian bytes of the words from addr up to the next zero word"""
+        memory = self.memory
+        # array.index only takes start/stop from Python 3.10, so search slices,
+        # starting small and doubling so short strings copy only a few words
+        size = 64
+        while True:
+            words = memory[addr:addr + size]
+            try:
+                del words[words.index(0):]
+                break
+            except ValueError:
+                if addr + size < len(memory):
+                    size *= 2
+                    continue
+            # No terminator before the top of memory: wrap around to 0x0000
+            head = memory[:addr]
+            try:
+                del head[head.index(0):]
+            except ValueError:
+                pass
+            words += head
+            break
+        if sys.byteorder == 'big':
+            words.byteswap()
+        return words.tobytes()
+    
+    def _execute_trap(self, trap_code: int, _b: int, _c: int) -> bool:
         """Execute trap instruction"""
-        self.reg[self.R_R7] = self.reg[self.R_PC]
-        trap_code = instr & 0xFF
+        self.reg[self.R_R7] = self.pc
         
         if trap_code == self.TRAP_GETC:
             if self.input_buffer:
-                self.reg[self.R_R0] = ord(self.input_buffer.pop(0))
+                self.reg[self.R_R0] = ord(self.input_buffer.popleft())
                 self.update_flags(self.R_R0)
             else:
                 return 'WAIT_FOR_INPUT'
         elif trap_code == self.TRAP_OUT:
-            self.output_buffer.append(chr(self.reg[self.R_R0] & 0xFF))
+            self.output_buffer.append(self.reg[self.R_R0] & 0xFF)
         elif trap_code == self.TRAP_PUTS:
-            addr = self.reg[self.R_R0]
-            while self.memory[addr] != 0:
-                self.output_buffer.append(chr(self.memory[addr] & 0xFF))
-                addr = (addr + 1) & 0xFFFF
+            # One character per word: the low byte of each
+            data = self._string_bytes(self.reg[self.R_R0])
+            self.output_buffer.extend(data[0::2])
         elif trap_code == self.TRAP_IN:
             if self.input_buffer:
-                char = self.input_buffer.pop(0)
-                self.output_buffer.append(char)
+                char = self.input_buffer.popleft()
+                self.output_buffer.extend(char.encode('latin-1', 'replace'))
                 self.reg[self.R_R0] = ord(char)
                 self.update_flags(self.R_R0)
             else:
                 return 'WAIT_FOR_INPUT'
         elif trap_code == self.TRAP_PUTSP:
-            addr = self.reg[self.R_R0]
-            while self.memory[addr] != 0:
-                char1 = self.memory[addr] & 0xFF
-                char2 = (self.memory[addr] >> 8) & 0xFF
-                if char1:
-                    self.output_buffer.append(chr(char1))
-                if char2:
-                    self.output_buffer.append(chr(char2))
-                addr = (addr + 1) & 0xFFFF
+            # Two characters per word, low byte first; zero bytes are skipped
+            data = self._string_bytes(self.reg[self.R_R0])
+            self.output_buffer.extend(data.replace(b'\0', b''))
         elif trap_code == self.TRAP_HALT:
-            self.output_buffer.append("HALT\n")
+            self.output_buffer.extend(b"HALT\n")
             return False
         
         return True
@@ -343,6 +427,19 @@ class LC3Debugger:
         self.running_thread = None
         self.memory_view_start = tk.IntVar(value=0x3000)
         self.memory_view_end = tk.IntVar(value=0x3020)
+        # (start, end) parsed from the two variables, re-read only when they
+        # change; None while either entry holds text that is not an integer
+        self._memory_range: Optional[Tuple[int, int]] = (0x3000, 0x3020)
+        self.memory_view_start.trace_add('write', self._on_memory_range_changed)
+        self.memory_view_end.trace_add('write', self._on_memory_range_changed)
+        
+        # Last state shown in each pane, so idle refreshes skip Tk calls
+        self._shown_reg: Optional[List[int]] = None
+        self._shown_status: Optional[Tuple[str, str]] = None
+        self._shown_breakpoints: Optional[Set[int]] = None
+        self._display_job: Optional[str] = None
+        # Memory view as last rendered: (start address, [(value, prefix), ...])
+        self._shown_memory: Optional[Tuple[int, List[Tuple[int, str]]]] = None
         
         self.setup_ui()
         self.update_display()
@@ -434,7 +531,9 @@ class LC3Debugger:
         mem_display_frame = ttk.Frame(mem_frame)
         mem_display_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=(0, 5))
         
-        self.memory_text = scrolledtext.ScrolledText(mem_display_frame, height=15, font=("Courier", 9))
+        # Read-only: update_memory_view rewrites single lines by line number
+        self.memory_text = scrolledtext.ScrolledText(mem_display_frame, height=15, font=("Courier", 9),
+                                                     state=tk.DISABLED)
         self.memory_text.pack(fill=tk.BOTH, expand=True)
         
         # Output/Console
@@ -461,15 +560,23 @@ class LC3Debugger:
         self.update_output()
         self.update_breakpoints()
         
-        # Schedule next update
-        self.root.after(100, self.update_display)
+        # Schedule next update, replacing any pending one so that direct calls
+        # (after load/step/reset) do not start extra polling chains
+        if self._display_job is not None:
+            self.root.after_cancel(self._display_job)
+        self._display_job = self.root.after(100, self.update_display)
     
     def update_registers(self):
         """Update register display"""
+        reg = list(self.vm.reg)
+        if reg == self._shown_reg:
+            return
+        self._shown_reg = reg
+        
         reg_names = ['R0', 'R1', 'R2', 'R3', 'R4', 'R5', 'R6', 'R7', 'PC', 'COND']
         for i, name in enumerate(reg_names):
-            if i < len(self.vm.reg):
-                value = self.vm.reg[i]
+            if i < len(reg):
+                value = reg[i]
                 hex_val = f"0x{value:04X}"
                 dec_val = f"({value})"
                 
@@ -482,70 +589,105 @@ class LC3Debugger:
     def update_status(self):
         """Update status display"""
         if self.vm.halted:
-            self.status_label.config(text="Halted", foreground="red")
+            status = ("Halted", "red")
         elif self.vm.running:
-            self.status_label.config(text="Running", foreground="blue")
+            status = ("Running", "blue")
         else:
-            self.status_label.config(text="Ready", foreground="green")
+            status = ("Ready", "green")
+        
+        if status != self._shown_status:
+            self._shown_status = status
+            self.status_label.config(text=status[0], foreground=status[1])
+    
+    def _on_memory_range_changed(self, *args):
+        """Re-read the memory view range after either entry is edited"""
+        try:
+            self._memory_range = (self.memory_view_start.get(), self.memory_view_end.get())
+        except tk.TclError:
+            self._memory_range = None
     
     def update_memory_view(self):
         """Update memory view display"""
-        self.memory_text.delete(1.0, tk.END)
+        start, end = self._memory_range or (-1, -1)
         
-        start = self.memory_view_start.get()
-        end = self.memory_view_end.get()
+        memory_text = self.memory_text
         
         if start < 0 or end >= self.vm.MAX_MEMORY or start > end:
-            self.memory_text.insert(tk.END, "Invalid memory range\n")
+            memory_text.config(state=tk.NORMAL)
+            memory_text.delete(1.0, tk.END)
+            memory_text.insert(tk.END, "Invalid memory range\n")
+            memory_text.config(state=tk.DISABLED)
+            self._shown_memory = None
             return
         
+        memory = self.vm.memory
+        pc = self.vm.pc
+        breakpoints = self.vm.breakpoints
+        
+        # (value, prefix) per line: all that can change for a fixed address
+        keys = []
         for addr in range(start, min(end + 1, self.vm.MAX_MEMORY)):
-            value = self.vm.memory[addr]
-            
             # Highlight current PC
-            if addr == self.vm.reg[self.vm.R_PC]:
+            if addr == pc:
                 prefix = ">> "
-            elif addr in self.vm.breakpoints:
+            elif addr in breakpoints:
                 prefix = "BP "
             else:
                 prefix = "   "
-            
-            # Format: address: value (instruction or data)
-            instr_str = self.disassemble_instruction(value)
-            line = f"{prefix}0x{addr:04X}: 0x{value:04X} {instr_str}\n"
-            
-            self.memory_text.insert(tk.END, line)
+            keys.append((memory[addr], prefix))
+        
+        shown = self._shown_memory
+        if shown is None or shown[0] != start or len(shown[1]) != len(keys):
+            # New range: render every line
+            memory_text.config(state=tk.NORMAL)
+            memory_text.delete(1.0, tk.END)
+            memory_text.insert(tk.END, ''.join(
+                self._format_memory_line(start + i, value, prefix) + "\n"
+                for i, (value, prefix) in enumerate(keys)))
+            memory_text.config(state=tk.DISABLED)
+        else:
+            # Same range: rewrite only the lines whose value or marker changed
+            changed = [i for i, key in enumerate(keys) if key != shown[1][i]]
+            if changed:
+                memory_text.config(state=tk.NORMAL)
+                for i in changed:
+                    line = f"{i + 1}.0"
+                    memory_text.delete(line, f"{i + 1}.end")
+                    memory_text.insert(line, self._format_memory_line(start + i, *keys[i]))
+                memory_text.config(state=tk.DISABLED)
+        
+        self._shown_memory = (start, keys)
+    
+    def _format_memory_line(self, addr: int, value: int, prefix: str) -> str:
+        """Format: address: value (instruction or data)"""
+        instr_str = self.disassemble_instruction(value)
+        return f"{prefix}0x{addr:04X}: 0x{value:04X} {instr_str}"
     
     def disassemble_instruction(self, instr: int) -> str:
         """Simple disassembler for display"""
         op = instr >> 12
-        opcode_names = {
-            0: "BR", 1: "ADD", 2: "LD", 3: "ST", 4: "JSR", 5: "AND",
-            6: "LDR", 7: "STR", 8: "RTI", 9: "NOT", 10: "LDI", 11: "STI",
-            12: "JMP", 13: "RES", 14: "LEA", 15: "TRAP"
-        }
-        
-        if op in opcode_names:
-            if op == 15:  # TRAP
-                trap_code = instr & 0xFF
-                trap_names = {
-                    0x20: "GETC", 0x21: "OUT", 0x22: "PUTS",
-                    0x23: "IN", 0x24: "PUTSP", 0x25: "HALT"
-                }
-                return f"TRAP {trap_names.get(trap_code, f'0x{trap_code:02X}')}"
-            return opcode_names[op]
-        return "DATA"
+        if op == 15:  # TRAP
+            trap_code = instr & 0xFF
+            return f"TRAP {_TRAP_NAMES.get(trap_code, f'0x{trap_code:02X}')}"
+        return _OPCODE_NAMES[op]
     
     def update_output(self):
         """Update console output"""
-        if self.vm.output_buffer:
-            output = ''.join(self.vm.output_buffer)
-            self.vm.output_buffer.clear()
+        buffer = self.vm.output_buffer
+        if buffer:
+            # Drop only what was decoded; the run thread may still be appending
+            n = len(buffer)
+            output = buffer[:n].decode('latin-1')
+            del buffer[:n]
             self.output_text.insert(tk.END, output)
             self.output_text.see(tk.END)
     
     def update_breakpoints(self):
         """Update breakpoint list"""
+        if self.vm.breakpoints == self._shown_breakpoints:
+            return
+        self._shown_breakpoints = set(self.vm.breakpoints)
+        
         self.bp_listbox.delete(0, tk.END)
         for bp in sorted(self.vm.breakpoints):
             self.bp_listbox.insert(tk.END, f"0x{bp:04X}")
@@ -582,19 +724,17 @@ class LC3Debugger:
     
     def _run_thread(self):
         """Thread for running the program"""
-        while self.vm.running and not self.vm.halted:
-            if not self.vm.step():
-                # If we paused for input, just stop running
-                self.vm.running = False
-                break
-            
-            # Check for breakpoints
-            if self.vm.reg[self.vm.R_PC] in self.vm.breakpoints:
-                self.vm.running = False
+        vm = self.vm
+        batch = 5000
+        
+        while vm.running and not vm.halted:
+            if not vm.run_batch(batch):
+                # Halted, paused for input or reached a breakpoint
+                vm.running = False
                 break
             
-            # Small delay to prevent UI freezing
-            time.sleep(0.001)
+            # Yield to the UI thread between batches instead of after every step
+            time.sleep(0)
     
     def step_program(self):
         """Execute one instruction"""
@@ -611,6 +751,9 @@ class LC3Debugger:
     def reset_program(self):
         """Reset the virtual machine"""
         self.vm.running = False
+        # Let the current batch finish so it cannot step the freshly reset VM
+        if self.running_thread is not None and self.running_thread.is_alive():
+            self.running_thread.join()
         self.vm.reset()
         self.update_memory_view()
         self.update_display()
@@ -625,7 +768,7 @@ class LC3Debugger:
                 addr = int(addr_str)
             
             if 0 <= addr < self.vm.MAX_MEMORY:
-                self.vm.breakpoints.add(addr)
+                self.vm.add_breakpoint(addr)
                 self.bp_entry.delete(0, tk.END)
                 self.update_breakpoints()
                 self.update_memory_view()
@@ -640,7 +783,7 @@ class LC3Debugger:
         if selection:
             addr_str = self.bp_listbox.get(selection[0])
             addr = int(addr_str, 16)
-            self.vm.breakpoints.discard(addr)
+            self.vm.remove_breakpoint(addr)
             self.update_breakpoints()
             self.update_memory_view()
     
@@ -648,8 +791,7 @@ class LC3Debugger:
         """Send input to the virtual machine"""
         text = self.input_entry.get()
         if text:
-            for char in text:
-                self.vm.input_buffer.append(char)
+            self.vm.input_buffer.extend(text)
             self.input_entry.delete(0, tk.END)
             self.output_text.insert(tk.END, f"Input: {text}\n")
             self.output_text.see(tk.END)
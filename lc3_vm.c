@@ -153,6 +153,30 @@ void mem_write(uint16_t address, uint16_t val);
 uint16_t swap16(uint16_t x);
 void read_image_file(FILE* file);
 
+/*
+GCC and Clang support "labels as values", so each opcode handler can jump straight to the next
+handler through a table of label addresses instead of going back through the loop and the switch.
+Every handler then ends in its own indirect jump, which the branch predictor can learn separately.
+Other compilers (e.g. MSVC) fall back to the plain while/switch loop.
+*/
+#if defined(__GNUC__) || defined(__clang__)
+#define USE_COMPUTED_GOTO 1
+#else
+#define USE_COMPUTED_GOTO 0
+#endif
+
+#if USE_COMPUTED_GOTO
+#define TARGET(op) op_##op:
+#define DISPATCH() do { \
+        if (!running) goto done; \
+        instr = mem_read(reg[R_PC]++); \
+        goto *dispatch_table[instr >> 12]; \
+    } while (0)
+#else
+#define TARGET(op) case op:
+#define DISPATCH() break
+#endif
+
 int main(int argc, const char*argv[]){
 
     // (load arguments)
@@ -180,14 +204,26 @@ int main(int argc, const char*argv[]){
     reg[R_PC] = PC_START;
     
     int running = 1;
+#if USE_COMPUTED_GOTO
+    // one label per opcode, in the same order as the instruction set enum
+    static void* dispatch_table[16] = {
+        &&op_BR, &&op_ADD, &&op_LD, &&op_ST, &&op_JSR, &&op_AND, &&op_LDR, &&op_STR,
+        &&op_RTI, &&op_NOT, &&op_LDI, &&op_STI, &&op_JMP, &&op_RES, &&op_LEA, &&op_TRAP
+    };
+    uint16_t instr;
+    DISPATCH();
+    {
+        {
+#else
     while(running){
 
         uint16_t instr = mem_read(reg[R_PC]++);
         uint16_t op = instr >> 12; // extracts the top 4 bits to determine the opcode
 
         switch(op){
+#endif
 
-            case BR:
+            TARGET(BR)
             {
                 uint16_t pc_offset = sign_extend(instr & 0x1FF,9);
                 uint16_t condition_flag = (instr >> 9) & 0x7;
@@ -195,8 +231,8 @@ int main(int argc, const char*argv[]){
                     reg[R_PC] += pc_offset;
                 }
             }
-                break;
-            case ADD:
+                DISPATCH();
+            TARGET(ADD)
             {
                 // this is the destination register (DR)
                 uint16_t r0 = (instr >> 9) & 0b0111;  // we and this with 0111 to remove the leading 1 since the opcode binary for add is 0001. This will result in just the 
@@ -221,24 +257,24 @@ int main(int argc, const char*argv[]){
                 
                 update_flags(r0);
             }
-                break;
-            case LD:
+                DISPATCH();
+            TARGET(LD)
             {
                 uint16_t r0 = (instr >> 9) & 0x7;
                 uint16_t pc_offset = sign_extend(instr & 0x1FF,9);
                 reg[r0] = mem_read(reg[R_PC]+pc_offset);
                 update_flags(r0);
             }
-                break;
-            case ST:
+                DISPATCH();
+            TARGET(ST)
             {
                 uint16_t r0 = (instr >> 9) & 0x7;
                  
                 uint16_t offset = sign_extend(instr & 0b111111111,9);
                 mem_write(reg[R_PC]+offset,reg[r0]);
             }
-                break;
-            case JSR:
+                DISPATCH();
+            TARGET(JSR)
             {
                 uint16_t flag = (instr >> 11) & 0b1;
                 reg[R_R7] = reg[R_PC];
@@ -250,8 +286,8 @@ int main(int argc, const char*argv[]){
                     reg[R_PC] = reg[r1];
                 }
             }
-                break;
-            case AND:
+                DISPATCH();
+            TARGET(AND)
             {
                 //destination register (DR)
                 uint16_t r0 = (instr >> 9) & 0x7;
@@ -268,8 +304,8 @@ int main(int argc, const char*argv[]){
                 reg[r0] = result;
                 update_flags(r0);
             }
-                break;
-            case LDR:
+                DISPATCH();
+            TARGET(LDR)
             {
                 uint16_t r0 = (instr >> 9) & 0x7;
                 uint16_t r1 = (instr >> 6) & 0x7;
@@ -278,18 +314,18 @@ int main(int argc, const char*argv[]){
                 reg[r0] = mem_read(reg[r1] + offset);
                 update_flags(r0);
             }
-                break;
-            case STR:
+                DISPATCH();
+            TARGET(STR)
             {
                     uint16_t r0 = (instr >> 9) & 0x7;
                     uint16_t r1 = (instr >> 6) & 0x7;
                     uint16_t offset = sign_extend(instr & 0x3F, 6);
                     mem_write(reg[r1] + offset, reg[r0]);
             }
-                break;
-            case RTI:
-                break;
-            case NOT:
+                DISPATCH();
+            TARGET(RTI)
+                DISPATCH();
+            TARGET(NOT)
             {
                 // destination register (DR)
                 uint16_t r0 = (instr >> 9) & 0x7;
@@ -297,8 +333,8 @@ int main(int argc, const char*argv[]){
                 reg[r0] = ~reg[r1];
                 update_flags(r0);
             }
-                break;  
-            case LDI:
+                DISPATCH();
+            TARGET(LDI)
                 {
                     // destination register (DR)
                     uint16_t r0 = (instr >> 9) & 0x7;
@@ -310,8 +346,8 @@ int main(int argc, const char*argv[]){
                     update_flags(r0);
 
                 }
-                break;
-            case STI:
+                DISPATCH();
+            TARGET(STI)
             {
                     // destination register (DR)
                     uint16_t r0 = (instr >> 9) & 0x7;
@@ -322,23 +358,23 @@ int main(int argc, const char*argv[]){
                     mem_write(mem_read(reg[R_PC]+pc_offset),reg[r0]);
                     
             }
-                break;
-            case JMP:
+                DISPATCH();
+            TARGET(JMP)
             {
                 reg[R_PC] = reg[(instr >> 6) & 0x7];
             }
-                break;
-            case RES:
-                break;
-            case LEA:
+                DISPATCH();
+            TARGET(RES)
+                DISPATCH();
+            TARGET(LEA)
             {
                 uint16_t r0 = (instr >> 9) & 0x7;
                 uint16_t offset = sign_extend((instr & 0x1FF),9);
                 reg[r0] = reg[R_PC] + offset;
                 update_flags(r0); 
             }
-                break;
-            case TRAP:
+                DISPATCH();
+            TARGET(TRAP)
                 reg[R_R7] = reg[R_PC];
                 
                 switch (instr & 0xFF)
@@ -429,12 +465,17 @@ int main(int argc, const char*argv[]){
 
                 }
 
-                break;
+                DISPATCH();
+#if !USE_COMPUTED_GOTO
             default:
                 abort();
                 break;
+#endif
         }
     }
+#if USE_COMPUTED_GOTO
+done:
+#endif
     restore_input_buffering();
 }
 